@@ -64,8 +64,13 @@ options:
   cipher:
     description:
       - Encryption cipher
+      - GCM ciphers are written as C(ncp-ciphers) so clients can negotiate them;
+        other ciphers are written as a legacy C(cipher) directive
+      - C(ncp-ciphers) is understood by OpenVPN 2.4 and later; 2.5 renamed it
+        C(data-ciphers) and keeps the old name as an alias. The newer name is
+        not written because OpenVPN 2.4 rejects it
     type: str
-    default: 'AES-256-CBC'
+    default: 'AES-256-GCM'
   vpn_network:
     description:
       - VPN network in CIDR notation (e.g., 10.8.0.0/24)
@@ -156,6 +161,13 @@ options:
       - Certificate validity in days
     type: int
     default: 3650
+  dh_fast_mode:
+    description:
+      - Generate Diffie-Hellman parameters with C(openssl dhparam -dsaparam), which is
+        much faster than searching for a safe prime
+      - Set to false to use C(easyrsa gen-dh) instead
+    type: bool
+    default: true
 requirements:
   - OpenVPN
   - Easy-RSA (for key generation)
@@ -269,50 +281,177 @@ config_path:
 '''
 
 from ansible.module_utils.basic import AnsibleModule
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import functools
+import mmap
 import os
+import shutil
+import stat
 import subprocess
 import sys
+import tempfile
+import threading
+
+
+# Distribution family, detected once per process
+if os.path.exists('/etc/debian_version'):
+    _DISTRO_FAMILY = 'debian'
+elif os.path.exists('/etc/redhat-release'):
+    _DISTRO_FAMILY = 'redhat'
+else:
+    _DISTRO_FAMILY = None
+
+# Where the saved iptables rules are loaded from at boot
+if _DISTRO_FAMILY == 'redhat':
+    _IPTABLES_RULES_FILE = '/etc/sysconfig/iptables'
+else:
+    _IPTABLES_RULES_FILE = '/etc/iptables/rules.v4'
+
+
+def run_command(command, cwd=None):
+    """Run a command and return output.
+
+    A list is executed directly; a string is run through the shell.
+    """
+    result = subprocess.run(
+        command,
+        shell=isinstance(command, str),
+        capture_output=True,
+        text=True,
+        cwd=cwd
+    )
+    return result.returncode, result.stdout, result.stderr
+
 
+def _file_equals(path, data):
+    """Check if the file at path holds exactly data.
 
-def run_command(command, check=False):
-    """Run a shell command and return output."""
+    A size mismatch is detected from stat alone; same-size files are
+    mapped and compared in place without reading them into memory.
+    """
     try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            check=check
-        )
-        return result.returncode, result.stdout, result.stderr
-    except subprocess.CalledProcessError as e:
-        return e.returncode, e.stdout, e.stderr
+        st = os.stat(path)
+    except FileNotFoundError:
+        return False
+    if st.st_size != len(data):
+        return False
+    if not data:
+        return True
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            return view == data
+
+
+def _secure_write(path, data, mode=0o600):
+    """Atomically replace path with the bytes in data.
+
+    The data is written and synced to a uniquely named hidden temporary
+    file in the same directory, which is then renamed over path, so readers
+    never see a partial file. A symlinked path is resolved first so the
+    link is kept and its target is updated.
+    """
+    path = os.path.realpath(path)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            os.fchmod(f.fileno(), mode)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _write_if_changed(path, data, mode=None, check_mode=False):
+    """Write bytes to path unless the file already holds them.
+
+    The file is written with mode; if unset, an existing file keeps its
+    mode and a new one gets 0o644. Nothing is written in check_mode.
+    Returns whether the content differed.
+    """
+    if _file_equals(path, data):
+        return False
+
+    if not check_mode:
+        if mode is None:
+            try:
+                mode = stat.S_IMODE(os.stat(path).st_mode)
+            except FileNotFoundError:
+                mode = 0o644
+        _secure_write(path, data, mode)
+
+    return True
+
+
+@functools.lru_cache(maxsize=None)
+def _have(binary):
+    """Check if an executable is on PATH, caching the result per process."""
+    return shutil.which(binary) is not None
 
 
 def check_openvpn_installed():
     """Check if OpenVPN is installed."""
-    returncode, _, _ = run_command('which openvpn')
-    return returncode == 0
+    return _have('openvpn')
 
 
 def install_openvpn(module):
     """Install OpenVPN."""
-    # Detect package manager
-    if os.path.exists('/etc/debian_version'):
-        cmd = 'apt-get update && apt-get install -y openvpn easy-rsa'
-    elif os.path.exists('/etc/redhat-release'):
-        cmd = 'yum install -y openvpn easy-rsa'
+    # Pick the package manager for the detected distribution
+    if _DISTRO_FAMILY == 'debian':
+        commands = [
+            ['apt-get', 'update'],
+            ['apt-get', 'install', '-y', 'openvpn', 'easy-rsa'],
+        ]
+    elif _DISTRO_FAMILY == 'redhat':
+        commands = [['yum', 'install', '-y', 'openvpn', 'easy-rsa']]
     else:
         module.fail_json(msg='Unsupported operating system')
 
-    returncode, stdout, stderr = run_command(cmd)
-    
-    if returncode != 0:
-        module.fail_json(msg=f'Failed to install OpenVPN: {stderr}')
+    for cmd in commands:
+        returncode, stdout, stderr = run_command(cmd)
+        if returncode != 0:
+            module.fail_json(msg=f'Failed to install OpenVPN: {stderr}')
     
     return True
 
 
+def _run_pki_steps(steps, running, lock, cancelled):
+    """Run PKI commands in order, stopping at the first failure.
+
+    Each started process is recorded in running under lock so another job's
+    failure can terminate it; no new step starts once cancelled is set.
+    Returns (error, messages) where error is None on success.
+    """
+    messages = []
+    for command, cwd, error, done in steps:
+        with lock:
+            if cancelled.is_set():
+                return None, messages
+            try:
+                proc = subprocess.Popen(
+                    command,
+                    cwd=cwd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True
+                )
+            except OSError as e:
+                # e.g. the binary is missing; report it like a failed step
+                return f'{error}: {e}', messages
+            running.append(proc)
+        _, stderr = proc.communicate()
+        if proc.returncode != 0:
+            return f'{error}: {stderr}', messages
+        if done:
+            messages.append(done)
+    return None, messages
+
+
 def generate_pki(module, params):
     """Generate PKI using Easy-RSA."""
     pki_dir = params['pki_dir']
@@ -326,54 +465,74 @@ def generate_pki(module, params):
     os.makedirs(pki_dir, exist_ok=True)
     
     # Check if Easy-RSA is available
-    returncode, _, _ = run_command('which easyrsa')
-    if returncode != 0:
+    if not _have('easyrsa'):
         module.fail_json(msg='Easy-RSA not found. Please install it first.')
     
     # Initialize PKI if not already done
     if not os.path.exists(f'{pki_dir}/pki'):
-        cmd = f'cd {pki_dir} && easyrsa init-pki'
-        returncode, _, stderr = run_command(cmd)
+        returncode, _, stderr = run_command(['easyrsa', 'init-pki'], cwd=pki_dir)
         if returncode != 0:
             module.fail_json(msg=f'Failed to initialize PKI: {stderr}')
         message.append('PKI initialized')
     
+    # Each job is a sequence of (command, cwd, error, done message) steps.
+    # The certificate chain, DH parameters and TLS auth key do not depend
+    # on each other, so the jobs run concurrently. Easy-RSA commands share
+    # files in the PKI directory, so they all stay in the certificate chain.
+    cert_chain = []
+    
     # Generate CA certificate
     if not os.path.exists(f'{pki_dir}/pki/ca.crt'):
-        cmd = f'cd {pki_dir} && easyrsa build-ca nopass'
-        returncode, _, stderr = run_command(cmd)
-        if returncode != 0:
-            module.fail_json(msg=f'Failed to generate CA: {stderr}')
-        message.append('CA certificate generated')
+        cert_chain.append((['easyrsa', 'build-ca', 'nopass'], pki_dir,
+                           'Failed to generate CA', 'CA certificate generated'))
     
     # Generate server certificate and key
     if not os.path.exists(f'{pki_dir}/pki/issued/server.crt'):
-        cmd = f'cd {pki_dir} && easyrsa gen-req server nopass'
-        returncode, _, stderr = run_command(cmd)
-        if returncode != 0:
-            module.fail_json(msg=f'Failed to generate server request: {stderr}')
-        
-        cmd = f'cd {pki_dir} && easyrsa sign-req server server nopass'
-        returncode, _, stderr = run_command(cmd)
-        if returncode != 0:
-            module.fail_json(msg=f'Failed to sign server certificate: {stderr}')
-        message.append('Server certificate generated')
+        cert_chain.append((['easyrsa', 'gen-req', 'server', 'nopass'], pki_dir,
+                           'Failed to generate server request', None))
+        cert_chain.append((['easyrsa', 'sign-req', 'server', 'server', 'nopass'], pki_dir,
+                           'Failed to sign server certificate', 'Server certificate generated'))
+    
+    jobs = [cert_chain]
     
     # Generate Diffie-Hellman parameters
-    if not os.path.exists(f'{pki_dir}/pki/dh.pem'):
-        cmd = f'cd {pki_dir} && easyrsa gen-dh'
-        returncode, _, stderr = run_command(cmd)
-        if returncode != 0:
-            module.fail_json(msg=f'Failed to generate DH parameters: {stderr}')
-        message.append('Diffie-Hellman parameters generated')
+    dh_out = f'{pki_dir}/pki/dh.pem'
+    if not os.path.exists(dh_out):
+        dh_error = 'Failed to generate DH parameters'
+        dh_done = 'Diffie-Hellman parameters generated'
+        if params.get('dh_fast_mode', True):
+            dh_cmd = ['openssl', 'dhparam', '-dsaparam', '-out', dh_out, str(key_size)]
+            jobs.append([(dh_cmd, pki_dir, dh_error, dh_done)])
+        else:
+            cert_chain.append((['easyrsa', 'gen-dh'], pki_dir, dh_error, dh_done))
     
     # Generate TLS authentication key
     if not os.path.exists(params['tls_auth_key']):
-        cmd = f'openvpn --genkey --secret {params["tls_auth_key"]}'
-        returncode, _, stderr = run_command(cmd)
-        if returncode != 0:
-            module.fail_json(msg=f'Failed to generate TLS auth key: {stderr}')
-        message.append('TLS authentication key generated')
+        jobs.append([(['openvpn', '--genkey', '--secret', params['tls_auth_key']], None,
+                      'Failed to generate TLS auth key', 'TLS authentication key generated')])
+    
+    jobs = [job for job in jobs if job]
+    if jobs:
+        running = []
+        lock = threading.Lock()
+        cancelled = threading.Event()
+        error = None
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(_run_pki_steps, job, running, lock, cancelled) for job in jobs]
+            for future in as_completed(futures):
+                error = future.result()[0]
+                if error:
+                    # Stop the other jobs rather than waiting for them
+                    with lock:
+                        cancelled.set()
+                        for proc in running:
+                            if proc.poll() is None:
+                                proc.terminate()
+                    break
+        if error:
+            module.fail_json(msg=error)
+        for future in futures:
+            message.extend(future.result()[1])
     
     # Copy certificates to OpenVPN directory
     os.makedirs(openvpn_dir, exist_ok=True)
@@ -388,10 +547,7 @@ def generate_pki(module, params):
     for src, dst in files_to_copy:
         if os.path.exists(src) and not os.path.exists(dst):
             try:
-                with open(src, 'r') as f_in:
-                    content = f_in.read()
-                with open(dst, 'w') as f_out:
-                    f_out.write(content)
+                shutil.copyfile(src, dst)
                 os.chmod(dst, 0o600)
             except Exception as e:
                 module.fail_json(msg=f'Failed to copy {src} to {dst}: {str(e)}')
@@ -417,10 +573,11 @@ def write_ccd_files(module, params):
     if not ccd:
         return False, 'No CCD entries'
 
-    try:
-        os.makedirs(ccd_dir, exist_ok=True)
-    except Exception as e:
-        module.fail_json(msg=f'Failed to create ccd directory {ccd_dir}: {str(e)}')
+    if not module.check_mode:
+        try:
+            os.makedirs(ccd_dir, exist_ok=True)
+        except Exception as e:
+            module.fail_json(msg=f'Failed to create ccd directory {ccd_dir}: {str(e)}')
 
     changed = False
     messages = []
@@ -432,16 +589,16 @@ def write_ccd_files(module, params):
             ifconfig_value = str(value)
 
         filename = os.path.join(ccd_dir, client)
-        content = f"ifconfig-push {ifconfig_value}\n"
+        content = f"ifconfig-push {ifconfig_value}\n".encode()
 
         # Write if different
         try:
-            if not os.path.exists(filename) or open(filename).read() != content:
-                with open(filename, 'w') as f:
-                    f.write(content)
-                os.chmod(filename, 0o600)
+            if _write_if_changed(filename, content, mode=0o600, check_mode=module.check_mode):
                 changed = True
-                messages.append(f'Wrote CCD for {client}')
+                if module.check_mode:
+                    messages.append(f'Would write CCD for {client}')
+                else:
+                    messages.append(f'Wrote CCD for {client}')
         except Exception as e:
             module.fail_json(msg=f'Failed to write CCD file {filename}: {str(e)}')
 
@@ -449,146 +606,166 @@ def write_ccd_files(module, params):
 
 
 
-def generate_server_config(module, params):
-    """Generate OpenVPN server configuration."""
-    config_content = f"""
-# OpenVPN Server Configuration
-port {params['port']}
-proto {params['protocol']}
-dev tun
-
-ca {params['ca_cert']}
-cert {params['server_cert']}
-key {params['server_key']}
-dh {params['dh_pem']}
-
-tls-auth {params['tls_auth_key']} 0
-
-cipher {params['cipher']}
+def _cipher_directive(cipher):
+    """Return the config line selecting the data channel cipher."""
+    name = cipher.upper()
+    if name.endswith('-GCM'):
+        ciphers = [name] + [c for c in ('AES-256-GCM', 'AES-128-GCM') if c != name]
+        # ncp-ciphers rather than data-ciphers: OpenVPN 2.4 only knows this name
+        return f"ncp-ciphers {':'.join(ciphers)}"
+    return f"cipher {cipher}"
 
-server {params['vpn_network']} {params['vpn_netmask']}
 
-"""
+def generate_server_config(module, params):
+    """Generate OpenVPN server configuration."""
+    topology = params.get('topology', 'subnet')
+    fragment = params.get('fragment', 0)
+    dns_servers = params.get('dns_servers') or ()
+    routes = params.get('routes') or ()
+    extra_server_options = params.get('extra_server_options') or ()
+
+    lines = [
+        "# OpenVPN Server Configuration",
+        f"port {params['port']}",
+        f"proto {params['protocol']}",
+        "dev tun",
+        "",
+        f"ca {params['ca_cert']}",
+        f"cert {params['server_cert']}",
+        f"key {params['server_key']}",
+        f"dh {params['dh_pem']}",
+        "",
+        f"tls-auth {params['tls_auth_key']} 0",
+        "",
+        _cipher_directive(params['cipher']),
+        "",
+        f"server {params['vpn_network']} {params['vpn_netmask']}",
+        "",
+    ]
 
     # Add topology setting if not p2p
-    if params.get('topology', 'subnet') != 'p2p':
-      config_content += f"topology {params.get('topology', 'subnet')}\n"
+    if topology != 'p2p':
+        lines.append(f"topology {topology}")
 
     # Add client-to-client if enabled
     if params.get('client_to_client'):
-      config_content += "client-to-client\n"
+        lines.append("client-to-client")
 
     # Allow duplicate CNs if requested
     if params.get('duplicate_cn'):
-      config_content += "duplicate-cn\n"
+        lines.append("duplicate-cn")
 
     # Add redirect-gateway if enabled
     if params.get('redirect_gateway'):
-      config_content += 'push "redirect-gateway def1 bypass-dhcp"\n'
+        lines.append('push "redirect-gateway def1 bypass-dhcp"')
 
     # Add DNS servers
-    for dns in params.get('dns_servers', []):
-      config_content += f'push "dhcp-option DNS {dns}"\n'
+    lines.extend(f'push "dhcp-option DNS {dns}"' for dns in dns_servers)
 
     # Add custom routes
-    for route in params.get('routes', []):
-      config_content += f'push "route {route}"\n'
+    lines.extend(f'push "route {route}"' for route in routes)
 
     # Add MSS fix if enabled
     if params.get('mssfix'):
-      config_content += "mssfix\n"
+        lines.append("mssfix")
 
     # Add fragment if specified
-    if params.get('fragment', 0) > 0:
-      config_content += f"fragment {params.get('fragment', 0)}\n"
+    if fragment > 0:
+        lines.append(f"fragment {fragment}")
 
     # Common default server settings
-    default_server_settings = [
-      "persist-key",
-      "persist-tun",
-      "user nobody",
-      "group nogroup",
-      "status openvpn-status.log",
-      "verb 3",
-      "mute 20",
-      "keepalive 10 120",
-    ]
-
-    for line in default_server_settings:
-      config_content += f"{line}\n"
-
-    # Append any extra server options provided by the user
-    for opt in params.get('extra_server_options', []) or []:
-      config_content += f"{opt}\n"
+    lines.extend([
+        "persist-key",
+        "persist-tun",
+        "user nobody",
+        # RHEL-family systems have no 'nogroup' group
+        "group nobody" if _DISTRO_FAMILY == 'redhat' else "group nogroup",
+        "status openvpn-status.log",
+        "verb 3",
+        "mute 20",
+        "keepalive 10 120",
+    ])
 
     if params.get('enable_compress'):
-      config_content += "compress lz4\n"
-    
-    config_content += """
-user nobody
-group nogroup
+        lines.append("compress lz4")
 
-persist-key
-persist-tun
+    # Append any extra server options provided by the user last
+    lines.extend(extra_server_options)
 
-status openvpn-status.log
-verb 3
-"""
+    config_content = ("\n".join(lines) + "\n").encode()
 
     config_path = params['config_file']
     
     # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(config_path), exist_ok=True)
+    if not module.check_mode:
+        os.makedirs(os.path.dirname(config_path), exist_ok=True)
     
-    config_changed = False
-    if not os.path.exists(config_path):
-        config_changed = True
-    else:
-        with open(config_path, 'r') as f:
-            if f.read() != config_content:
-                config_changed = True
-    
-    if config_changed or module.params.get('state') == 'present':
-        with open(config_path, 'w') as f:
-            f.write(config_content)
+    config_changed = _write_if_changed(config_path, config_content, check_mode=module.check_mode)
     
     return config_changed, config_path
 
 
+def _ip_forward_enabled():
+    """Check if IPv4 forwarding is already enabled."""
+    try:
+        with open('/proc/sys/net/ipv4/ip_forward', 'rb') as f:
+            return f.read().strip() == b'1'
+    except OSError:
+        return False
+
+
 def configure_nat(module, params):
     """Configure NAT masquerading for VPN traffic."""
     if not params['enable_nat']:
         return False
     
+    changed = False
+    
     # Enable IP forwarding
-    run_command('sysctl -w net.ipv4.ip_forward=1')
+    if not _ip_forward_enabled():
+        if not module.check_mode:
+            returncode, _, stderr = run_command(['sysctl', '-w', 'net.ipv4.ip_forward=1'])
+            if returncode != 0:
+                module.fail_json(msg=f'Failed to enable IP forwarding: {stderr}')
+        changed = True
     
-    # Add iptables rules
-    cmd = f"iptables -t nat -A POSTROUTING -s {params['vpn_network']} -o eth0 -j MASQUERADE"
-    returncode, stdout, stderr = run_command(cmd)
+    # Add the iptables rule only if it is not already present
+    rule = ['POSTROUTING', '-s', params['vpn_network'], '-o', 'eth0', '-j', 'MASQUERADE']
+    returncode, _, _ = run_command(['iptables', '-t', 'nat', '-C'] + rule)
+    if returncode == 0:
+        return changed
     
-    # Save iptables rules
-    run_command('iptables-save > /etc/iptables/rules.v4')
+    # The rule check above is read-only; never modify iptables in check mode
+    if module.check_mode:
+        return True
     
-    return returncode == 0
+    returncode, _, stderr = run_command(['iptables', '-t', 'nat', '-A'] + rule)
+    if returncode != 0:
+        module.fail_json(msg=f'Failed to add NAT rule: {stderr}')
+    
+    # Save iptables rules. The file is written here rather than through a
+    # shell redirect because its directory only exists once a persistence
+    # package such as iptables-persistent is installed.
+    returncode, stdout, stderr = run_command(['iptables-save'])
+    if returncode != 0:
+        module.fail_json(msg=f'Failed to save iptables rules: {stderr}')
+    try:
+        os.makedirs(os.path.dirname(_IPTABLES_RULES_FILE), exist_ok=True)
+        _write_if_changed(_IPTABLES_RULES_FILE, stdout.encode())
+    except OSError as e:
+        module.fail_json(msg=f'Failed to save iptables rules to {_IPTABLES_RULES_FILE}: {str(e)}')
+    
+    return True
 
 
 def manage_service(module, action):
     """Manage OpenVPN service."""
     service_name = 'openvpn@server'
     
-    if action == 'start':
-        cmd = f'systemctl start {service_name}'
-    elif action == 'stop':
-        cmd = f'systemctl stop {service_name}'
-    elif action == 'restart':
-        cmd = f'systemctl restart {service_name}'
-    elif action == 'status':
-        cmd = f'systemctl status {service_name}'
-    else:
+    if action not in ('start', 'stop', 'restart', 'status'):
         return False, 'Unknown action'
     
-    returncode, stdout, stderr = run_command(cmd)
+    returncode, stdout, stderr = run_command(['systemctl', action, service_name])
     
     if action == 'status':
         return True, stdout
@@ -608,7 +785,7 @@ def main():
             dh_pem=dict(type='str', default='/etc/openvpn/dh.pem'),
             port=dict(type='int', default=1194),
             protocol=dict(type='str', choices=['udp', 'tcp'], default='udp'),
-            cipher=dict(type='str', default='AES-256-CBC'),
+            cipher=dict(type='str', default='AES-256-GCM'),
             vpn_network=dict(type='str', default='10.8.0.0/24'),
             vpn_netmask=dict(type='str', default='255.255.255.0'),
             enable_nat=dict(type='bool', default=True),
@@ -630,6 +807,7 @@ def main():
             pki_dir=dict(type='str', default='/etc/openvpn/easy-rsa'),
             key_size=dict(type='int', choices=[2048, 4096], default=2048),
             cert_days=dict(type='int', default=3650),
+            dh_fast_mode=dict(type='bool', default=True),
         ),
         supports_check_mode=True,
         required_together=[['mode', 'action']],
@@ -641,44 +819,49 @@ def main():
     status = None
 
     try:
-        # Check if OpenVPN is installed
-        if not check_openvpn_installed() and params['action'] == 'install':
-            if not module.check_mode:
-                install_openvpn(module)
-            changed = True
-            message.append('OpenVPN installed')
+        if params['action'] == 'install':
+            # Only installs need to know whether OpenVPN is already present
+            if not check_openvpn_installed():
+                if not module.check_mode:
+                    install_openvpn(module)
+                changed = True
+                message.append('OpenVPN installed')
 
-        # Generate PKI if requested
-        if params['generate_pki'] and params['action'] == 'install':
-            if not module.check_mode:
-                pki_success, pki_message = generate_pki(module, params)
-                if pki_success:
-                    changed = True
-                    message.append(pki_message)
-            else:
-                message.append('Would generate PKI')
+            # Generate PKI if requested
+            if params['generate_pki']:
+                if not module.check_mode:
+                    pki_success, pki_message = generate_pki(module, params)
+                    if pki_success:
+                        changed = True
+                        message.append(pki_message)
+                else:
+                    message.append('Would generate PKI')
 
         # Configure OpenVPN
         if params['action'] == 'configure':
-            if not module.check_mode:
-                config_changed, config_path = generate_server_config(module, params)
-                if config_changed:
-                    changed = True
+            config_changed, config_path = generate_server_config(module, params)
+            if config_changed:
+                changed = True
+                if module.check_mode:
+                    message.append(f'Would write configuration to {config_path}')
+                else:
                     message.append(f'Configuration written to {config_path}')
-                
-                if params['enable_nat']:
-                    nat_configured = configure_nat(module, params)
-                    if nat_configured:
-                        changed = True
+
+            # Both helpers only report what would change in check mode
+            if params['enable_nat']:
+                nat_configured = configure_nat(module, params)
+                if nat_configured:
+                    changed = True
+                    if module.check_mode:
+                        message.append('Would configure NAT masquerading')
+                    else:
                         message.append('NAT masquerading configured')
-                # Write client-config-dir files if specified
-                if params.get('ccd'):
-                  ccd_changed, ccd_msg = write_ccd_files(module, params)
-                  if ccd_changed:
+            # Write client-config-dir files if specified
+            if params.get('ccd'):
+                ccd_changed, ccd_msg = write_ccd_files(module, params)
+                if ccd_changed:
                     changed = True
                     message.append(ccd_msg)
-            else:
-                message.append('Would generate configuration')
 
         # Manage service
         if params['action'] in ['start', 'stop', 'restart', 'status']:
@@ -6,15 +6,22 @@ Test suite for OpenVPN Ansible Module
 import unittest
 import sys
 import os
+import tempfile
+import threading
+import time
 from unittest.mock import patch, MagicMock
 
 # Add module path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from plugins.modules.openvpn_configure import (
+    _cipher_directive,
+    _have,
     check_openvpn_installed,
     generate_server_config,
     configure_nat,
+    generate_pki,
+    write_ccd_files,
 )
 
 
@@ -24,6 +31,15 @@ class TestOpenVPNModule(unittest.TestCase):
     def setUp(self):
         """Set up test fixtures"""
         self.mock_module = MagicMock()
+        self.mock_module.check_mode = False
+
+        # Keep saved iptables rules out of /etc
+        rules_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(rules_dir.cleanup)
+        self.rules_file = os.path.join(rules_dir.name, 'iptables', 'rules.v4')
+        rules_patcher = patch('plugins.modules.openvpn_configure._IPTABLES_RULES_FILE', self.rules_file)
+        rules_patcher.start()
+        self.addCleanup(rules_patcher.stop)
         self.test_params = {
             'mode': 'server',
             'action': 'configure',
@@ -45,42 +61,289 @@ class TestOpenVPNModule(unittest.TestCase):
 
     def test_openvpn_installed_check(self):
         """Test OpenVPN installation check"""
-        with patch('subprocess.run') as mock_run:
-            mock_run.return_value = MagicMock(returncode=0)
+        self.addCleanup(_have.cache_clear)
+        with patch('shutil.which') as mock_which:
+            mock_which.return_value = '/usr/sbin/openvpn'
+            _have.cache_clear()
             result = check_openvpn_installed()
             self.assertTrue(result)
 
-            mock_run.return_value = MagicMock(returncode=1)
+            mock_which.return_value = None
+            _have.cache_clear()
             result = check_openvpn_installed()
             self.assertFalse(result)
 
-    @patch('builtins.open', create=True)
+            # Result is cached for the rest of the process
+            mock_which.return_value = '/usr/sbin/openvpn'
+            self.assertFalse(check_openvpn_installed())
+
+    @patch('os.replace')
+    @patch('os.fsync')
+    @patch('os.fchmod')
+    @patch('os.fdopen')
+    @patch('tempfile.mkstemp', return_value=(5, '/tmp/.test_openvpn.conf.abc123'))
     @patch('os.makedirs')
     @patch('os.path.exists')
-    def test_generate_server_config(self, mock_exists, mock_makedirs, mock_open):
+    def test_generate_server_config(self, mock_exists, mock_makedirs, mock_mkstemp, mock_fdopen,
+                                    mock_fchmod, mock_fsync, mock_replace):
         """Test server configuration generation"""
         mock_exists.return_value = False
         mock_file = MagicMock()
-        mock_open.return_value.__enter__.return_value = mock_file
+        mock_fdopen.return_value.__enter__.return_value = mock_file
 
         changed, config_path = generate_server_config(self.mock_module, self.test_params)
 
         self.assertTrue(changed)
         self.assertEqual(config_path, '/tmp/test_openvpn.conf')
         mock_file.write.assert_called()
+        mock_replace.assert_called_once_with('/tmp/.test_openvpn.conf.abc123', os.path.realpath('/tmp/test_openvpn.conf'))
+
+    def test_server_config_directives_emitted_once(self):
+        """Test default directives appear once and extra options come last"""
+        with tempfile.TemporaryDirectory() as config_dir:
+            params = dict(self.test_params)
+            params['config_file'] = os.path.join(config_dir, 'server.conf')
+            params['extra_server_options'] = ['user openvpn']
+
+            generate_server_config(self.mock_module, params)
+            with open(params['config_file']) as f:
+                lines = f.read().splitlines()
+
+            for directive in ('persist-key', 'persist-tun', 'user nobody',
+                              'status openvpn-status.log', 'verb 3', 'compress lz4'):
+                self.assertEqual(lines.count(directive), 1, directive)
+            self.assertEqual(lines[-1], 'user openvpn')
+
+            # Unchanged content is not rewritten, and check mode never writes
+            changed, _ = generate_server_config(self.mock_module, params)
+            self.assertFalse(changed)
+            params['port'] = 443
+            self.mock_module.check_mode = True
+            changed, _ = generate_server_config(self.mock_module, params)
+            self.assertTrue(changed)
+            with open(params['config_file']) as f:
+                self.assertIn('port 1194', f.read())
+
+    def test_server_config_group_follows_distro(self):
+        """Test the group directive matches the distribution family"""
+        with tempfile.TemporaryDirectory() as config_dir:
+            params = dict(self.test_params, config_file=os.path.join(config_dir, 'server.conf'))
+            for family, group in (('debian', 'nogroup'), ('redhat', 'nobody')):
+                with patch('plugins.modules.openvpn_configure._DISTRO_FAMILY', family):
+                    generate_server_config(self.mock_module, params)
+                with open(params['config_file']) as f:
+                    lines = f.read().splitlines()
+                self.assertIn(f'group {group}', lines)
+
+    def _run_generate_pki(self, failures=(), blocking=(), missing=(), **overrides):
+        """Run generate_pki with fake processes; return the commands started"""
+        started = []
+
+        class FakePopen(object):
+            def __init__(self, command, **kwargs):
+                if command[:2] in missing:
+                    raise FileNotFoundError(2, 'No such file or directory', command[0])
+                self.command = command
+                self.returncode = None
+                self.terminated = threading.Event()
+                started.append(self)
+
+            def communicate(self):
+                if self.command[:2] in blocking:
+                    self.terminated.wait(10)
+                    self.returncode = -15 if self.terminated.is_set() else 0
+                else:
+                    self.returncode = 1 if self.command[:2] in failures else 0
+                return '', 'boom' if self.returncode else ''
+
+            def poll(self):
+                return self.returncode
+
+            def terminate(self):
+                self.terminated.set()
+
+        with tempfile.TemporaryDirectory() as pki_dir, \
+                patch('plugins.modules.openvpn_configure._have', return_value=True), \
+                patch('plugins.modules.openvpn_configure.run_command', return_value=(0, '', '')), \
+                patch('subprocess.Popen', FakePopen):
+            params = dict(self.test_params, pki_dir=pki_dir, key_size=2048, cert_days=3650,
+                          tls_auth_key=os.path.join(pki_dir, 'ta.key'))
+            params.update(overrides)
+            try:
+                generate_pki(self.mock_module, params)
+            finally:
+                self.started = started
+        return [proc.command[:2] for proc in started]
+
+    def test_generate_pki_runs_independent_steps(self):
+        """Test every PKI step runs and DH uses openssl in fast mode"""
+        commands = self._run_generate_pki()
+        for expected in (['easyrsa', 'build-ca'], ['easyrsa', 'sign-req'],
+                         ['openssl', 'dhparam'], ['openvpn', '--genkey']):
+            self.assertIn(expected, commands)
+        self.assertNotIn(['easyrsa', 'gen-dh'], commands)
+        for call in self.mock_module.fail_json.call_args_list:
+            self.assertFalse(call.kwargs['msg'].startswith('Failed to generate'))
+
+    def test_generate_pki_easyrsa_dh_runs_in_chain(self):
+        """Test easyrsa gen-dh never overlaps the other easyrsa steps"""
+        commands = self._run_generate_pki(dh_fast_mode=False)
+        easyrsa = [c for c in commands if c[0] == 'easyrsa']
+        self.assertEqual(easyrsa, [['easyrsa', 'build-ca'], ['easyrsa', 'gen-req'],
+                                   ['easyrsa', 'sign-req'], ['easyrsa', 'gen-dh']])
+
+    def test_generate_pki_failure_stops_other_jobs(self):
+        """Test a failing step is reported without waiting for slow jobs"""
+        self.mock_module.fail_json.side_effect = SystemExit(1)
+        start = time.monotonic()
+        with self.assertRaises(SystemExit):
+            self._run_generate_pki(failures=(['easyrsa', 'build-ca'],),
+                                   blocking=(['openssl', 'dhparam'],))
+        self.assertLess(time.monotonic() - start, 5)
+        self.mock_module.fail_json.assert_called_once_with(msg='Failed to generate CA: boom')
+        dh = [p for p in self.started if p.command[:2] == ['openssl', 'dhparam']]
+        self.assertTrue(dh and dh[0].terminated.is_set())
+
+    def test_generate_pki_missing_binary_stops_other_jobs(self):
+        """Test a step that cannot start is reported like a failed step"""
+        self.mock_module.fail_json.side_effect = SystemExit(1)
+        start = time.monotonic()
+        with self.assertRaises(SystemExit):
+            self._run_generate_pki(missing=(['openssl', 'dhparam'],),
+                                   blocking=(['easyrsa', 'build-ca'],))
+        self.assertLess(time.monotonic() - start, 5)
+        msg = self.mock_module.fail_json.call_args.kwargs['msg']
+        self.assertTrue(msg.startswith('Failed to generate DH parameters: '), msg)
+        self.assertIn('No such file or directory', msg)
+        ca = [p for p in self.started if p.command[:2] == ['easyrsa', 'build-ca']]
+        self.assertTrue(ca and ca[0].terminated.is_set())
+
+    def test_write_ccd_files_idempotent(self):
+        """Test CCD files are only rewritten when their content changes"""
+        with tempfile.TemporaryDirectory() as ccd_dir:
+            params = {'ccd_dir': ccd_dir, 'ccd': {'alice': '10.8.0.10 255.255.255.0'}}
+
+            changed, _ = write_ccd_files(self.mock_module, params)
+            self.assertTrue(changed)
+            filename = os.path.join(ccd_dir, 'alice')
+            self.assertEqual(os.stat(filename).st_mode & 0o777, 0o600)
+            with open(filename) as f:
+                self.assertEqual(f.read(), 'ifconfig-push 10.8.0.10 255.255.255.0\n')
+
+            changed, _ = write_ccd_files(self.mock_module, params)
+            self.assertFalse(changed)
+
+            params['ccd']['alice'] = '10.8.0.11 255.255.255.0'
+            changed, _ = write_ccd_files(self.mock_module, params)
+            self.assertTrue(changed)
 
+    def test_write_ccd_files_keeps_similarly_named_clients(self):
+        """Test writing one client never removes another client's file"""
+        with tempfile.TemporaryDirectory() as ccd_dir:
+            params = {'ccd_dir': ccd_dir, 'ccd': {'alice.tmp': '10.8.0.12 255.255.255.0',
+                                                  'alice': '10.8.0.10 255.255.255.0'}}
+
+            changed, _ = write_ccd_files(self.mock_module, params)
+            self.assertTrue(changed)
+            self.assertEqual(sorted(os.listdir(ccd_dir)), ['alice', 'alice.tmp'])
+
+            changed, _ = write_ccd_files(self.mock_module, params)
+            self.assertFalse(changed)
+
+    def test_config_write_follows_symlink(self):
+        """Test a symlinked config stays a symlink and its target is updated"""
+        with tempfile.TemporaryDirectory() as config_dir:
+            target = os.path.join(config_dir, 'real.conf')
+            with open(target, 'w') as f:
+                f.write('old\n')
+            link = os.path.join(config_dir, 'server.conf')
+            os.symlink(target, link)
+
+            params = dict(self.test_params, config_file=link)
+            changed, _ = generate_server_config(self.mock_module, params)
+            self.assertTrue(changed)
+            self.assertTrue(os.path.islink(link))
+            with open(target) as f:
+                self.assertIn('port 1194', f.read())
+
+    @patch('plugins.modules.openvpn_configure._ip_forward_enabled', return_value=True)
     @patch('subprocess.run')
-    def test_configure_nat(self, mock_run):
+    def test_configure_nat(self, mock_run, mock_forward):
         """Test NAT configuration"""
-        mock_run.return_value = MagicMock(returncode=0)
+        # Rule missing: -C fails, then the rule is appended and saved, creating
+        # the rules directory when no persistence package has made it
+        self.assertFalse(os.path.exists(os.path.dirname(self.rules_file)))
+        saved = '*nat\n-A POSTROUTING -s 10.8.0.0/24 -o eth0 -j MASQUERADE\nCOMMIT\n'
+        mock_run.side_effect = [MagicMock(returncode=1), MagicMock(returncode=0),
+                                MagicMock(returncode=0, stdout=saved, stderr='')]
         result = configure_nat(self.mock_module, self.test_params)
         self.assertTrue(result)
+        self.assertEqual(mock_run.call_count, 3)
+        self.assertEqual(mock_run.call_args.args[0], ['iptables-save'])
+        with open(self.rules_file) as f:
+            self.assertEqual(f.read(), saved)
+
+        # Rule present: nothing else runs
+        mock_run.reset_mock()
+        mock_run.side_effect = None
+        mock_run.return_value = MagicMock(returncode=0)
+        result = configure_nat(self.mock_module, self.test_params)
+        self.assertFalse(result)
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertIn('-C', mock_run.call_args.args[0])
+
+    @patch('plugins.modules.openvpn_configure._ip_forward_enabled', return_value=False)
+    @patch('subprocess.run')
+    def test_configure_nat_failures(self, mock_run, mock_forward):
+        """Test failing NAT commands are reported instead of ignored"""
+        self.mock_module.fail_json.side_effect = SystemExit(1)
+        cases = (
+            ([1], 'Failed to enable IP forwarding: err'),
+            ([0, 1, 1], 'Failed to add NAT rule: err'),
+            ([0, 1, 0, 1], 'Failed to save iptables rules: err'),
+        )
+        for returncodes, msg in cases:
+            self.mock_module.fail_json.reset_mock()
+            mock_run.side_effect = [MagicMock(returncode=rc, stdout='', stderr='err') for rc in returncodes]
+            with self.assertRaises(SystemExit):
+                configure_nat(self.mock_module, self.test_params)
+            self.mock_module.fail_json.assert_called_once_with(msg=msg)
+
+    @patch('plugins.modules.openvpn_configure._ip_forward_enabled')
+    @patch('subprocess.run')
+    def test_configure_nat_check_mode(self, mock_run, mock_forward):
+        """Test check mode reports the real NAT state without changing it"""
+        self.mock_module.check_mode = True
+
+        mock_forward.return_value = True
+        mock_run.return_value = MagicMock(returncode=0)
+        self.assertFalse(configure_nat(self.mock_module, self.test_params))
+
+        mock_run.reset_mock()
+        mock_run.return_value = MagicMock(returncode=1)
+        self.assertTrue(configure_nat(self.mock_module, self.test_params))
+
+        mock_run.reset_mock()
+        mock_forward.return_value = False
+        mock_run.return_value = MagicMock(returncode=0)
+        self.assertTrue(configure_nat(self.mock_module, self.test_params))
+
+        # Only the read-only rule check ever ran
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertIn('-C', mock_run.call_args.args[0])
 
     def test_config_content_includes_cipher(self):
         """Test that config includes cipher"""
         # This is a basic content validation test
         self.assertEqual(self.test_params['cipher'], 'AES-256-CBC')
 
+    def test_gcm_cipher_uses_ncp_ciphers(self):
+        """Test GCM ciphers are negotiated via ncp-ciphers"""
+        self.assertEqual(_cipher_directive('AES-256-GCM'), 'ncp-ciphers AES-256-GCM:AES-128-GCM')
+        self.assertEqual(_cipher_directive('AES-128-GCM'), 'ncp-ciphers AES-128-GCM:AES-256-GCM')
+        self.assertEqual(_cipher_directive('aes-256-gcm'), 'ncp-ciphers AES-256-GCM:AES-128-GCM')
+        self.assertEqual(_cipher_directive('AES-256-CBC'), 'cipher AES-256-CBC')
+
     def test_config_content_includes_vpn_network(self):
         """Test that config includes VPN network"""
         self.assertEqual(self.test_params['vpn_network'], '10.8.0.0/24')